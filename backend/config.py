@@ -1,32 +1,52 @@
 # config.py
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@lru_cache(maxsize=None)
+def _get_env(name, default=None):
+    """Read an environment variable once and memoize the result"""
+    return os.getenv(name, default)
+
 class Config:
     # Pinecone Configuration
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-    PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
-    PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
+    PINECONE_API_KEY = _get_env("PINECONE_API_KEY")
+    PINECONE_CLOUD = _get_env("PINECONE_CLOUD", "aws")
+    PINECONE_REGION = _get_env("PINECONE_REGION", "us-east-1")
+    PINECONE_INDEX_NAME = _get_env("PINECONE_INDEX_NAME", "budget-bot")
     
     # FinGPT Configuration
-    HF_API_TOKEN=os.getenv("HF_API_TOKEN")
-    HF_MODEL=os.getenv("HF_MODEL")
-    HF_API_URL=os.getenv("HF_API_URL")
+    HF_API_TOKEN=_get_env("HF_API_TOKEN")
+    HF_MODEL=_get_env("HF_MODEL")
+    HF_API_URL=_get_env("HF_API_URL")
+
+    # Local model (optional, replaces the hosted HF API when set)
+    LOCAL_MODEL_ID = _get_env("LOCAL_MODEL_ID")
+    LOCAL_MODEL_DEVICE = _get_env("LOCAL_MODEL_DEVICE", "cuda")
+    LOCAL_MODEL_8BIT = _get_env("LOCAL_MODEL_8BIT", "false").lower() == "true"
+    LOCAL_MODEL_COMPILE = _get_env("LOCAL_MODEL_COMPILE", "false").lower() == "true"
  
     # Pinecone Index Configuration
-    INDEX_NAME = os.getenv("INDEX_NAME", "budget-bot")
-    NAMESPACE = os.getenv("NAMESPACE", "user_expenses")
+    INDEX_NAME = _get_env("INDEX_NAME", "budget-bot")
+    NAMESPACE = _get_env("NAMESPACE", "user_expenses")
     
     # Vector Configuration
-    EMBEDDING_MODEL = "multilingual-e5-large"
-    EMBEDDING_DIMENSION = 1024
+    EMBEDDING_MODEL = _get_env("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_DIMENSION = int(_get_env("EMBEDDING_DIMENSION", "384"))
+    # Relative paths are taken from the project root, not the working directory
+    EMBED_CACHE_PATH = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        _get_env("EMBED_CACHE_PATH", "embed_cache.db")
+    )
     
     # FastAPI Configuration
     API_HOST = "0.0.0.0"
     API_PORT = 8000
-    DEBUG_MODE = os.getenv("DEBUG", "false").lower() == "true"
+    DEBUG_MODE = _get_env("DEBUG", "false").lower() == "true"
+    # Uvicorn worker processes, set by start_backend.py; each one loads its own models
+    WORKERS = max(1, int(_get_env("WORKERS", "1")))
     
     @classmethod
     def validate_config(cls):
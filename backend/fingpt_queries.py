@@ -3,45 +3,54 @@ Security:
 If user-facing, ensure authentication on FastAPI endpoints to prevent unauthorized use.
 """
 
-from typing import List, Dict
-import os
-import json
-import pinecone
-import requests
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
+from typing import List, Dict, Tuple
+from collections import Counter, OrderedDict
+from datetime import datetime
+from operator import itemgetter
+import asyncio
+import hashlib
+import logging
+import re
+import traceback
+import httpx
+import orjson
+from cachetools import TTLCache
+
+from .config import config
 from .vector_manager import upsert_expenses_to_pinecone
 from .query_filter import extract_filters_from_query
 from .rag_query import query_user_expenses, format_context_from_results
 from .pinecone_manager import pinecone_manager
+from .local_model import local_model
 
-# Hugging Face config
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-HF_MODEL = os.getenv("HF_MODEL")
-HF_API_URL = os.getenv("HF_API_URL")
-
-if not HF_MODEL:
-    HF_MODEL = os.getenv("HF_MODEL", "gpt2")
-if not HF_API_URL:
-    HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/gpt2")
+logger = logging.getLogger(__name__)
 
-# Get Pinecone index from manager
-index = pinecone_manager.get_index()
-
-def build_prompt(question: str, context: str) -> str:
-    """
-    Prepare the prompt text sent to FinGPT.
-    """
-    return f"""
+# Hugging Face config
+HF_API_TOKEN = config.HF_API_TOKEN
+HF_MODEL = config.HF_MODEL or "gpt2"
+HF_API_URL = config.HF_API_URL or "https://api-inference.huggingface.co/models/gpt2"
+
+# Keyword groups for local_expense_analysis; matched on word starts so "budgets" or "cutting" still count
+_INTENT_RE = re.compile(
+    r"\b(?:(?P<big>biggest|highest|largest|most)"
+    r"|(?P<total>total|sum|all)"
+    r"|(?P<cat>category|categories)"
+    r"|(?P<save>save|reduce|cut|budget))",
+    re.IGNORECASE
+)
+# When a question hits several groups, the earlier one wins
+_INTENT_PRIORITY = ("big", "total", "cat", "save")
+
+# Constant parts of the FinGPT prompt, built once at import
+_PROMPT_HEADER = """
 **Role:** You are a financial analysis AI specialized in expense tracking and budgeting.
 
 **Objective:** Analyze user spending data and provide accurate, simple-to-understand answers strictly using the given context.
 
 **Context:** 
-{context}
+"""
+
+_PROMPT_FOOTER = """
 
 **Instructions:**
 **Instruction 1:** Answer only based on context.
@@ -60,25 +69,104 @@ def build_prompt(question: str, context: str) -> str:
 - Use bullet points for clarity.  
 
 Question:
-{question}
 """
 
+# Finished query results keyed on (user_id, question, expense fingerprint)
+result_cache = TTLCache(maxsize=256, ttl=300)
 
-def call_fingpt_api(prompt: str) -> str:
+# Content hashes of expenses already upserted, oldest first
+_SEEN_EXPENSES: "OrderedDict[str, None]" = OrderedDict()
+_SEEN_EXPENSES_MAX = 10_000
+
+def _normalize_expenses(expenses: List[Dict]) -> None:
     """
-    Send the prompt to Hugging Face FinGPT API and return the answer text.
+    Parse each expense date once and keep it under '_dt' (None if unparseable).
+    """
+    for expense in expenses:
+        date = expense['date']
+        if isinstance(date, datetime):
+            expense['_dt'] = date
+            continue
+        try:
+            expense['_dt'] = datetime.fromisoformat(date.replace('Z', '+00:00'))
+        except (AttributeError, TypeError, ValueError):
+            expense['_dt'] = None
+
+
+def _expense_hash(expense: Dict) -> str:
+    """
+    Content hash over every field that ends up in the stored vector.
+    """
+    key = (
+        f"{expense['user_id']}|{expense.get('id')}|{expense['amount']}|"
+        f"{expense['date']}|{expense['category']}|{expense.get('description', '')}"
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _remember_expenses(expense_hashes: List[str]) -> None:
+    """
+    Mark hashes as upserted, evicting the least recently seen past _SEEN_EXPENSES_MAX.
+    """
+    for h in expense_hashes:
+        _SEEN_EXPENSES[h] = None
+        _SEEN_EXPENSES.move_to_end(h)
+    while len(_SEEN_EXPENSES) > _SEEN_EXPENSES_MAX:
+        _SEEN_EXPENSES.popitem(last=False)
+
+
+def _format_expense_line(expense: Dict) -> str:
+    """
+    One line of fallback context for an expense; the description is only added when non-empty.
+    """
+    description = expense.get('description')
+    return (
+        f"Date: {_format_expense_date(expense)}, Amount: ₹{expense['amount']:.2f}, Category: {expense['category']}"
+        + (f", Description: {description}" if description and description.strip() else "")
+    )
+
+
+def _expenses_fingerprint(expenses: List[Dict]) -> frozenset:
+    """
+    Hashable summary of the fields that feed the context and answer.
+    """
+    return frozenset(
+        (e.get('id'), e['amount'], str(e['date']), e['category'], e['description'])
+        for e in expenses
+    )
+
+
+def _format_expense_date(expense: Dict) -> str:
+    """
+    Human-readable date for an expense normalized by _normalize_expenses.
+    """
+    date_obj = expense.get('_dt')
+    if date_obj is None:
+        return str(expense['date'])
+    return date_obj.strftime('%B %d, %Y')
+
+
+def build_prompt(question: str, context: str) -> str:
+    """
+    Prepare the prompt text sent to FinGPT.
+    """
+    return "".join((_PROMPT_HEADER, context, _PROMPT_FOOTER, question, "\n"))
+
+
+async def call_fingpt_api(prompt: str, client: httpx.AsyncClient) -> Tuple[str, bool]:
+    """
+    Send the prompt to Hugging Face FinGPT API and return (answer text, ok).
+    `ok` is False when the text is an apology for a failed call rather than a model answer.
+    `client` is the shared connection pool opened in the app lifespan.
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         # Validate API token
         if not HF_API_TOKEN or HF_API_TOKEN == "your_huggingface_token_here":
             logger.error("HF_API_TOKEN not properly configured")
-            return "I apologize, but the AI service is not properly configured. Please contact support."
+            return "I apologize, but the AI service is not properly configured. Please contact support.", False
         
-        logger.info(f"Calling FinGPT API with prompt length: {len(prompt)}")
-        logger.info(f"API URL: {HF_API_URL}")
+        logger.info("Calling FinGPT API with prompt length: %s", len(prompt))
+        logger.info("API URL: %s", HF_API_URL)
         
         headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
         
@@ -92,60 +180,59 @@ def call_fingpt_api(prompt: str) -> str:
         }
 
         logger.info("Sending request to FinGPT API...")
-        r = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
+        r = await client.post(HF_API_URL, headers=headers, json=payload)
 
-        logger.info(f"FinGPT API response status: {r.status_code}")
+        logger.info("FinGPT API response status: %s", r.status_code)
         
         if r.status_code != 200:
-            logger.error(f"FinGPT API error - Status: {r.status_code}, Response: {r.text}")
+            logger.error("FinGPT API error - Status: %s, Response: %s", r.status_code, r.text)
             
             # Handle specific error cases
             if r.status_code == 401:
-                return "I apologize, but there's an authentication issue with the AI service. Please check the API configuration."
+                return "I apologize, but there's an authentication issue with the AI service. Please check the API configuration.", False
             elif r.status_code == 403:
                 error_text = r.text.lower()
                 if "permissions" in error_text or "inference" in error_text:
-                    return "I apologize, but the AI service requires additional permissions. Please ensure your Hugging Face token has inference permissions enabled."
+                    return "I apologize, but the AI service requires additional permissions. Please ensure your Hugging Face token has inference permissions enabled.", False
                 else:
-                    return "I apologize, but access to the AI service is forbidden. Please check your API configuration."
+                    return "I apologize, but access to the AI service is forbidden. Please check your API configuration.", False
             elif r.status_code == 404:
-                return "I apologize, but the AI model is not available. The system will use local analysis instead."
+                return "I apologize, but the AI model is not available. The system will use local analysis instead.", False
             elif r.status_code == 503:
-                return "I apologize, but the AI service is currently unavailable. Please try again in a few minutes."
+                return "I apologize, but the AI service is currently unavailable. Please try again in a few minutes.", False
             else:
-                return f"I apologize, but there was an error with the AI service (Status: {r.status_code}). Please try again."
+                return f"I apologize, but there was an error with the AI service (Status: {r.status_code}). Please try again.", False
 
         try:
-            output = r.json()
-            logger.info(f"FinGPT API response type: {type(output)}")
-            logger.info(f"FinGPT API response: {output}")
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {e}")
-            return "I apologize, but the AI service returned an invalid response. Please try again."
+            output = orjson.loads(r.content)
+            logger.info("FinGPT API response type: %s", type(output))
+            logger.info("FinGPT API response: %s", output)
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse JSON response: %s", e)
+            return "I apologize, but the AI service returned an invalid response. Please try again.", False
 
         if isinstance(output, list) and len(output) > 0:
             if "generated_text" in output[0]:
                 answer = output[0]["generated_text"].strip()
-                logger.info(f"Generated answer length: {len(answer)}")
-                return answer
+                logger.info("Generated answer length: %s", len(answer))
+                return answer, True
             else:
-                logger.warning(f"No 'generated_text' in response: {output[0]}")
-                return "I apologize, but the AI service returned an unexpected response format. Please try again."
+                logger.warning("No 'generated_text' in response: %s", output[0])
+                return "I apologize, but the AI service returned an unexpected response format. Please try again.", False
         else:
-            logger.warning(f"Unexpected response format: {output}")
-            return "I apologize, but the AI service returned an unexpected response. Please try again."
+            logger.warning("Unexpected response format: %s", output)
+            return "I apologize, but the AI service returned an unexpected response. Please try again.", False
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error("FinGPT API request timed out")
-        return "I apologize, but the AI service is taking too long to respond. Please try again."
-    except requests.exceptions.ConnectionError:
+        return "I apologize, but the AI service is taking too long to respond. Please try again.", False
+    except httpx.ConnectError:
         logger.error("FinGPT API connection error")
-        return "I apologize, but I cannot connect to the AI service. Please check your internet connection and try again."
+        return "I apologize, but I cannot connect to the AI service. Please check your internet connection and try again.", False
     except Exception as e:
-        logger.error(f"Unexpected error calling FinGPT API: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        return f"I apologize, but there was an unexpected error: {str(e)}"
+        logger.error("Unexpected error calling FinGPT API: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
+        return f"I apologize, but there was an unexpected error: {str(e)}", False
     
 
 def local_expense_analysis(question: str, expenses: List[Dict]) -> str:
@@ -155,40 +242,29 @@ def local_expense_analysis(question: str, expenses: List[Dict]) -> str:
     if not expenses:
         return "No expenses found to analyze."
 
-    # Calculate basic statistics
-    total_amount = sum(e['amount'] for e in expenses)
-    category_totals = {}
-    date_totals = {}
+    # Calculate basic statistics in a single pass
+    total_amount = 0
+    category_totals = Counter()
+    biggest_expense = expenses[0]
 
     for expense in expenses:
-        # Category analysis
-        cat = expense['category']
-        category_totals[cat] = category_totals.get(cat, 0) + expense['amount']
+        amount = expense['amount']
+        total_amount += amount
+        category_totals[expense['category']] += amount
 
-        # Date analysis
-        date = expense['date']
-        date_totals[date] = date_totals.get(date, 0) + expense['amount']
-
-    # Find biggest expense
-    biggest_expense = max(expenses, key=lambda x: x['amount'])
+        # Track biggest expense
+        if amount > biggest_expense['amount']:
+            biggest_expense = expense
 
     # Find top category
-    top_category = max(category_totals.items(), key=lambda x: x[1])
+    top_category = max(category_totals.items(), key=itemgetter(1))
 
     # Analyze question and provide relevant answer
-    question_lower = question.lower()
+    intents = {m.lastgroup for m in _INTENT_RE.finditer(question)}
+    intent = next((name for name in _INTENT_PRIORITY if name in intents), "summary")
 
-    if any(word in question_lower for word in ['biggest', 'highest', 'largest', 'most']):
-        # Format date properly
-        try:
-            if isinstance(biggest_expense['date'], str):
-                from datetime import datetime
-                date_obj = datetime.fromisoformat(biggest_expense['date'].replace('Z', '+00:00'))
-                formatted_date = date_obj.strftime('%B %d, %Y')
-            else:
-                formatted_date = biggest_expense['date'].strftime('%B %d, %Y')
-        except:
-            formatted_date = str(biggest_expense['date'])
+    if intent == "big":
+        formatted_date = _format_expense_date(biggest_expense)
             
         # Build supporting details dynamically
         supporting_details = []
@@ -206,7 +282,7 @@ Actionable Recommendations:
 • Consider setting a budget limit for {biggest_expense['category']} category
 • Look for ways to reduce similar expenses in the future"""
 
-    elif any(word in question_lower for word in ['total', 'sum', 'all']):
+    elif intent == "total":
         return f"""Your total expenses are ₹{total_amount:.2f}.
 
 Supporting Details:
@@ -219,8 +295,8 @@ Actionable Recommendations:
 • Set monthly budget goals
 • Focus on reducing expenses in {top_category[0]} category"""
 
-    elif any(word in question_lower for word in ['category', 'categories']):
-        category_breakdown = "\n".join([f"• {cat}: ₹{amt:.2f}" for cat, amt in sorted(category_totals.items(), key=lambda x: x[1], reverse=True)])
+    elif intent == "cat":
+        category_breakdown = "\n".join([f"• {cat}: ₹{amt:.2f}" for cat, amt in category_totals.most_common()])
         return f"""Your spending by category:
 
 Supporting Details:
@@ -231,7 +307,7 @@ Actionable Recommendations:
 • Consider setting category-specific budgets
 • Review if all categories are necessary"""
 
-    elif any(word in question_lower for word in ['save', 'reduce', 'cut', 'budget']):
+    elif intent == "save":
         return f"""Here are ways to save money based on your spending:
 
 Supporting Details:
@@ -261,7 +337,7 @@ Actionable Recommendations:
 • Review expenses regularly to stay on track"""
 
 
-def query_fingpt(question: str, expenses: List[dict]):
+async def query_fingpt(question: str, expenses: List[dict], client: httpx.AsyncClient):
     """
     1. Upsert new/updated expenses to Pinecone
     2. Extract filters from query (user_id, date range, keywords)
@@ -269,12 +345,9 @@ def query_fingpt(question: str, expenses: List[dict]):
     4. Build prompt and send to FinGPT API
     5. Return LLM answer and context used
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
-        logger.info(f"Starting FinGPT query processing for question: {question}")
-        logger.info(f"Number of expenses: {len(expenses)}")
+        logger.info("Starting FinGPT query processing for question: %s", question)
+        logger.info("Number of expenses: %s", len(expenses))
         
         # Validate inputs
         if not question or not question.strip():
@@ -285,55 +358,65 @@ def query_fingpt(question: str, expenses: List[dict]):
             logger.error("No expenses provided")
             return {"error": "No expenses provided to analyze."}
 
-        # Validate expense structure
-        for i, expense in enumerate(expenses):
-            if not isinstance(expense, dict):
-                logger.error(f"Expense {i} is not a dictionary: {type(expense)}")
-                return {"error": f"Invalid expense format at index {i}"}
-            
-            required_fields = ['user_id', 'amount', 'category', 'description', 'date']
-            missing_fields = [field for field in required_fields if field not in expense]
-            if missing_fields:
-                logger.error(f"Expense {i} missing fields: {missing_fields}")
-                return {"error": f"Invalid expense data: missing {missing_fields}"}
+        _normalize_expenses(expenses)
 
         user_id = expenses[0]["user_id"]
-        logger.info(f"Processing for user_id: {user_id}")
-
-        # Step 1: Upsert expenses to Pinecone
-        if expenses:
-            try:
-                logger.info("Upserting expenses to Pinecone...")
-                upsert_expenses_to_pinecone(expenses)
-                logger.info("Successfully upserted expenses to Pinecone")
-            except ValueError as e:
-                logger.error(f"Pinecone upsert error: {e}")
-                return {"error": f"Failed to store expenses: {str(e)}"}
-            except Exception as e:
-                logger.error(f"Unexpected error during Pinecone upsert: {e}")
-                return {"error": f"Storage error: {str(e)}"}
-
-        # Step 2: Extract filters from query
-        try:
-            logger.info("Extracting filters from query...")
-            filter_data = extract_filters_from_query(question, user_id)
-            logger.info(f"Extracted filters: {filter_data}")
-        except Exception as e:
-            logger.error(f"Error extracting filters: {e}")
-            return {"error": f"Failed to process query filters: {str(e)}"}
+        logger.info("Processing for user_id: %s", user_id)
+
+        # Same question over the same expenses: skip the whole pipeline.
+        # Any added or edited expense changes the fingerprint, so stale entries are never hit.
+        cache_key = (user_id, question.strip(), _expenses_fingerprint(expenses))
+        cached_result = result_cache.get(cache_key)
+        if cached_result is not None:
+            logger.info("Returning cached FinGPT result")
+            return cached_result
+
+        # Only rows we haven't stored yet need to go to Pinecone
+        expense_hashes = [_expense_hash(expense) for expense in expenses]
+        new_expenses = [e for e, h in zip(expenses, expense_hashes) if h not in _SEEN_EXPENSES]
+        logger.info("%s of %s expenses are new since the last upsert", len(new_expenses), len(expenses))
+
+        # Steps 1 & 2: Upsert expenses to Pinecone and extract filters from query.
+        # The two are independent, so run them side by side.
+        logger.info("Upserting expenses to Pinecone and extracting filters from query...")
+        upsert_result, filter_data = await asyncio.gather(
+            upsert_expenses_to_pinecone(new_expenses),
+            asyncio.to_thread(extract_filters_from_query, question, user_id),
+            return_exceptions=True
+        )
+
+        if isinstance(upsert_result, ValueError):
+            logger.error("Pinecone upsert error: %s", upsert_result)
+            return {"error": f"Failed to store expenses: {str(upsert_result)}"}
+        elif isinstance(upsert_result, Exception):
+            logger.error("Unexpected error during Pinecone upsert: %s", upsert_result)
+            return {"error": f"Storage error: {str(upsert_result)}"}
+        if upsert_result:
+            _remember_expenses(expense_hashes)
+            logger.info("Successfully upserted expenses to Pinecone")
+        elif pinecone_manager.is_available():
+            # Nothing is marked as seen, so the next request retries these rows
+            logger.warning("Expenses were not stored in Pinecone, will retry on the next request")
+        else:
+            logger.debug("Pinecone not configured, expenses were not stored")
+
+        if isinstance(filter_data, Exception):
+            logger.error("Error extracting filters: %s", filter_data)
+            return {"error": f"Failed to process query filters: {str(filter_data)}"}
+        logger.info("Extracted filters: %s", filter_data)
         
         # Step 3: Query Pinecone for relevant context
         try:
             logger.info("Querying Pinecone for relevant context...")
-            results = query_user_expenses(
-                index=index,
+            results = await query_user_expenses(
                 user_id=user_id,
                 query=question,
-                top_k=5
+                top_k=5,
+                filters=filter_data
             )
-            logger.info(f"Retrieved {len(results)} results from Pinecone")
+            logger.info("Retrieved %s results from Pinecone", len(results))
         except Exception as e:
-            logger.error(f"Error querying Pinecone: {e}")
+            logger.error("Error querying Pinecone: %s", e)
             return {"error": f"Failed to retrieve context: {str(e)}"}
 
         # Step 4: Format context
@@ -343,67 +426,51 @@ def query_fingpt(question: str, expenses: List[dict]):
             # If no context from Pinecone, create fallback context from raw expenses
             if not context or context == "No relevant expense data found for your query.":
                 logger.info("No Pinecone context available, creating fallback context from raw expenses")
-                context_lines = []
-                for expense in expenses:
-                    # Format date properly
-                    try:
-                        if isinstance(expense['date'], str):
-                            from datetime import datetime
-                            date_obj = datetime.fromisoformat(expense['date'].replace('Z', '+00:00'))
-                            formatted_date = date_obj.strftime('%B %d, %Y')
-                        else:
-                            formatted_date = expense['date'].strftime('%B %d, %Y')
-                    except:
-                        formatted_date = str(expense['date'])
-                        
-                    # Build context line dynamically
-                    context_parts = [
-                        f"Date: {formatted_date}",
-                        f"Amount: ₹{expense['amount']:.2f}",
-                        f"Category: {expense['category']}"
-                    ]
-                    
-                    # Only add description if it exists and is not empty
-                    if expense.get('description') and expense['description'].strip():
-                        context_parts.append(f"Description: {expense['description']}")
-                    
-                    context_line = ", ".join(context_parts)
-                    context_lines.append(context_line)
-                context = "\n".join(context_lines)
-                logger.info(f"Created fallback context with {len(expenses)} expenses")
+                context = "\n".join(_format_expense_line(expense) for expense in expenses)
+                logger.info("Created fallback context with %s expenses", len(expenses))
             
-            logger.info(f"Formatted context length: {len(context)} characters")
+            logger.info("Formatted context length: %s characters", len(context))
         except Exception as e:
-            logger.error(f"Error formatting context: {e}")
+            logger.error("Error formatting context: %s", e)
             return {"error": f"Failed to format context: {str(e)}"}
 
         # Step 5: Build prompt
         try:
             prompt = build_prompt(question, context)
-            logger.info(f"Built prompt length: {len(prompt)} characters")
+            logger.info("Built prompt length: %s characters", len(prompt))
         except Exception as e:
-            logger.error(f"Error building prompt: {e}")
+            logger.error("Error building prompt: %s", e)
             return {"error": f"Failed to build prompt: {str(e)}"}
 
-        # Step 6: Call FinGPT API
+        # Step 6: Call FinGPT (local model when loaded, hosted HF API otherwise)
         try:
-            logger.info("Calling FinGPT API...")
-            answer = call_fingpt_api(prompt)
-            logger.info(f"FinGPT response length: {len(answer)} characters")
+            answer = None
+            # Only answers the model actually produced are worth caching
+            from_model = False
+            if local_model.is_available():
+                try:
+                    logger.info("Generating answer with local model...")
+                    answer = await asyncio.to_thread(local_model.generate, prompt)
+                    from_model = True
+                except Exception as e:
+                    logger.error("Local model error, falling back to FinGPT API: %s", e)
+
+            if answer is None:
+                logger.info("Calling FinGPT API...")
+                answer, from_model = await call_fingpt_api(prompt, client)
+            logger.info("FinGPT response length: %s characters", len(answer))
             
-            # Check if the answer indicates an error and use fallback
-            if any(error_indicator in answer.lower() for error_indicator in [
-                'not properly configured', 'authentication issue', 'permissions', 
-                'forbidden', 'not available', 'unavailable', 'error with the ai service'
-            ]):
+            # The API call failed and returned an apology; answer locally instead
+            if not from_model:
                 logger.warning("FinGPT API returned error, using local analysis fallback")
                 answer = local_expense_analysis(question, expenses)
                 logger.info("Local analysis completed successfully")
                 
         except Exception as e:
-            logger.error(f"FinGPT API error: {e}")
+            logger.error("FinGPT API error: %s", e)
             logger.info("Using local analysis fallback due to API error")
             answer = local_expense_analysis(question, expenses)
+            from_model = False
             logger.info("Local analysis completed successfully")
 
         # Step 7: Return result
@@ -414,11 +481,13 @@ def query_fingpt(question: str, expenses: List[dict]):
             "num_chunks": len(results)
         }
         
+        # Fallback and apology answers aren't cached, so a retry reaches the model again
+        if from_model:
+            result_cache[cache_key] = result
         logger.info("Successfully completed FinGPT query processing")
         return result
         
     except Exception as e:
-        logger.error(f"Unexpected error in query_fingpt: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Unexpected error in query_fingpt: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
         return {"error": f"Unexpected error: {str(e)}"}
@@ -0,0 +1,78 @@
+import logging
+import threading
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+class LocalModelManager:
+    """
+    Optional in-process text generation with Transformers.
+    Only used when LOCAL_MODEL_ID is set; otherwise the hosted HF API is used.
+    """
+
+    def __init__(self):
+        self.model_id = config.LOCAL_MODEL_ID
+        self.device = config.LOCAL_MODEL_DEVICE
+        self.model = None
+        self.tokenizer = None
+        self._torch = None
+        # generate() is not safe to run concurrently on one model instance
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.model_id:
+            return
+
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+        except ImportError as e:
+            logger.warning(f"⚠️  Local model requested but dependencies are missing: {e}")
+            return
+
+        try:
+            logger.info(f"🧠 Loading local model '{self.model_id}' on {self.device}...")
+            quantization_config = BitsAndBytesConfig(load_in_8bit=True) if config.LOCAL_MODEL_8BIT else None
+
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_id,
+                torch_dtype=torch.bfloat16,
+                device_map=self.device,
+                quantization_config=quantization_config
+            )
+            self.model.eval()
+            self._torch = torch
+
+            if config.LOCAL_MODEL_COMPILE:
+                self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead")
+                # Warm up so the compile cost is paid at startup, not on the first query
+                self.generate("Hello", max_new_tokens=8)
+
+            logger.info("✅ Local model is ready")
+        except Exception as e:
+            logger.error(f"❌ Failed to load local model: {e}")
+            self.model = None
+            self.tokenizer = None
+
+    def is_available(self):
+        return self.model is not None
+
+    def generate(self, prompt: str, max_new_tokens: int = 256) -> str:
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        with self._lock, self._torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=True,
+                temperature=0.7,
+                top_p=0.9
+            )
+        # Only decode the newly generated tokens, not the echoed prompt
+        new_tokens = output[0][inputs["input_ids"].shape[1]:]
+        return self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+
+
+# Global instance
+local_model = LocalModelManager()
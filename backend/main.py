@@ -1,35 +1,27 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict
-import os
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import traceback
 from datetime import datetime
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+import httpx
 
+from .config import config
+from .schemas import QueryBody
 from .fingpt_queries import query_fingpt 
 from .pinecone_manager import pinecone_manager
+from .local_model import local_model
+from .vector_manager import warm_up_embedder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="BudgetBot API", version="1.0.0")
-
-# CORS middleware for frontend integration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("startup")
-async def startup_event():
-    """Log startup information"""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Log startup information and hold the shared HTTP client for FinGPT calls"""
     logger.info("🚀 BudgetBot Backend starting up...")
     
     # Check Pinecone availability
@@ -39,59 +31,93 @@ async def startup_event():
         logger.warning("⚠️  Pinecone vector search is not available - using fallback mode")
     
     # Check required environment variables
-    hf_token = os.getenv("HF_API_TOKEN")
+    hf_token = config.HF_API_TOKEN
     if not hf_token or hf_token == "your_huggingface_token_here":
         logger.warning("⚠️  HF_API_TOKEN not configured - FinGPT queries may fail")
     else:
         logger.info("✅ HF_API_TOKEN is configured")
 
+    # Load the embedding model now so the first query doesn't pay for it
+    if pinecone_manager.is_available():
+        try:
+            await asyncio.to_thread(warm_up_embedder)
+            logger.info("✅ Embedding model loaded")
+        except Exception as e:
+            logger.warning("⚠️  Failed to load embedding model: %s", e)
+
+    # Load the optional local model off the event loop
+    if config.LOCAL_MODEL_ID:
+        await asyncio.to_thread(local_model.load)
+
+    # Keep connections to the Hugging Face endpoint alive across requests
+    app.state.hf_client = httpx.AsyncClient(
+        timeout=30,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+    )
+    try:
+        yield
+    finally:
+        await app.state.hf_client.aclose()
+
+app = FastAPI(
+    title="BudgetBot API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# CORS middleware for frontend integration
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 @app.post("/api/query-fingpt")
-async def query_fingpt_endpoint(
-    question: str = Body(...),
-    expenses: List[Dict] = Body(..., embed=True)
-):
+async def query_fingpt_endpoint(request: Request, body: QueryBody):
+    # Expense fields are validated by the QueryBody schema before we get here
+    question = body.question
+    expenses = [expense.model_dump(mode="json") for expense in body.expenses]
+
     try:
-        logger.info(f"Received query: {question}")
-        logger.info(f"Number of expenses: {len(expenses)}")
-        logger.info(f"Expenses data: {expenses[:2]}")  # Log first 2 expenses for debugging
+        logger.info("Received query: %s", question)
+        logger.info("Number of expenses: %s", len(expenses))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Expenses data: %s", expenses[:2])  # Log first 2 expenses for debugging
         
         if not expenses:
             logger.warning("No expenses provided")
             return {"error": "No expenses provided to analyze."}
         
-        # Validate expense structure
-        for i, expense in enumerate(expenses):
-            required_fields = ['user_id', 'amount', 'category', 'description', 'date']
-            missing_fields = [field for field in required_fields if field not in expense]
-            if missing_fields:
-                logger.error(f"Expense {i} missing fields: {missing_fields}")
-                return {"error": f"Invalid expense data: missing {missing_fields}"}
-        
         try:
             logger.info("Calling query_fingpt function...")
-            result = query_fingpt(question=question, expenses=expenses)
-            logger.info(f"FinGPT result: {result}")
+            result = await query_fingpt(
+                question=question,
+                expenses=expenses,
+                client=request.app.state.hf_client
+            )
+            logger.info("FinGPT result: %s", result)
             
             if isinstance(result, dict) and "error" in result:
-                logger.error(f"FinGPT returned error: {result['error']}")
+                logger.error("FinGPT returned error: %s", result['error'])
                 return result
                 
             logger.info("Successfully processed query using FinGPT pipeline")
             return result
             
         except Exception as pipeline_error:
-            logger.error(f"Pipeline error: {pipeline_error}")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
+            logger.error("Pipeline error: %s", pipeline_error)
+            logger.error("Full traceback: %s", traceback.format_exc())
             raise HTTPException(
                 status_code=500, 
                 detail=f"FinGPT processing failed: {str(pipeline_error)}"
             )
         
     except Exception as e:
-        logger.error(f"Error processing query: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Error processing query: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/health")
@@ -101,7 +127,8 @@ async def health_check():
         "status": "healthy", 
         "timestamp": datetime.now().isoformat(),
         "pinecone_available": pinecone_manager.is_available(),
-        "hf_token_configured": bool(os.getenv("HF_API_TOKEN") and os.getenv("HF_API_TOKEN") != "your_huggingface_token_here")
+        "local_model_available": local_model.is_available(),
+        "hf_token_configured": bool(config.HF_API_TOKEN and config.HF_API_TOKEN != "your_huggingface_token_here")
     }
 
 @app.get("/")
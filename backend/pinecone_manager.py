@@ -1,18 +1,21 @@
-import os
 import time
 import logging
-from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
 
-load_dotenv()
+from .config import config
+
 logger = logging.getLogger(__name__)
 
 class PineconeManager:
     def __init__(self):
-        self.api_key = os.getenv("PINECONE_API_KEY")
-        self.index_name = os.getenv("PINECONE_INDEX_NAME", "budget-bot")
+        self.api_key = config.PINECONE_API_KEY
+        self.index_name = config.PINECONE_INDEX_NAME
         self.pc = None
         self.index = None
+        # True when this process created the index, so any local record of past upserts is stale
+        self.created_index = False
+        # (fetched_at, stats) from the last describe_index_stats call
+        self._stats_cache = (0.0, None)
 
         if not self.api_key:
             logger.error("❌ Pinecone API key not provided")
@@ -35,11 +38,20 @@ class PineconeManager:
                 logger.info(f"🆕 Creating new index '{self.index_name}'...")
                 self._create_index()
             else:
+                # An index built for another embedding model rejects every upsert and query
+                dimension = self.pc.describe_index(self.index_name).dimension
+                if dimension != config.EMBEDDING_DIMENSION:
+                    logger.error(
+                        f"❌ Index '{self.index_name}' has dimension {dimension} but embeddings are "
+                        f"{config.EMBEDDING_DIMENSION}-d ({config.EMBEDDING_MODEL}). Delete the index so it can "
+                        f"be recreated, or set PINECONE_INDEX_NAME to a new one. Vector search is disabled."
+                    )
+                    return
                 logger.info(f"🔗 Connecting to existing index '{self.index_name}'...")
                 self.index = self.pc.Index(self.index_name)
 
             if self.index:
-                stats = self.index.describe_index_stats()
+                stats = self.stats()
                 logger.info(f"📊 Connected to index. Stats: {stats}")
 
         except Exception as e:
@@ -52,7 +64,7 @@ class PineconeManager:
 
             self.pc.create_index(
                 name=self.index_name,
-                dimension=1536,
+                dimension=config.EMBEDDING_DIMENSION,
                 metric="cosine",
                 spec=spec
             )
@@ -66,6 +78,7 @@ class PineconeManager:
                 time.sleep(2)
 
             self.index = self.pc.Index(self.index_name)
+            self.created_index = True
             logger.info("🎯 Index is ready for use")
 
         except Exception as e:
@@ -78,12 +91,21 @@ class PineconeManager:
     def is_available(self):
         return self.index is not None
 
+    def stats(self, ttl=5.0):
+        """Index stats, refreshed from Pinecone at most once every `ttl` seconds"""
+        now = time.monotonic()
+        fetched_at, stats = self._stats_cache
+        if stats is None or now - fetched_at > ttl:
+            stats = self.index.describe_index_stats()
+            self._stats_cache = (now, stats)
+        return stats
+
     def test_connection(self):
         if not self.index:
             return {"status": "error", "message": "Index not available"}
 
         try:
-            stats = self.index.describe_index_stats()
+            stats = self.stats()
             return {"status": "success", "stats": stats}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -1,68 +1,137 @@
-import spacy
-import dateparser
+import re
+from datetime import date, datetime
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, List
 
-nlp = spacy.load("en_core_web_sm")
+# Cheap pre-check for anything that could be a date; queries without a match skip dateparser
+_DATE_HINT_RE = re.compile(
+    r"\b(?:today|yesterday|tomorrow|tonight|ago|week|weekend|month|year|"
+    r"jan(?:uary)?|feb(?:ruary)?|march|apr(?:il)?|june?|july?|aug(?:ust)?|"
+    r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|"
+    r"monday|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:rs(?:day)?)?|fri(?:day)?|saturday|sunday|"
+    # "may", "mar", "mon", "sat" and "sun" are also ordinary words ("May I save..."),
+    # so they only count next to a day number or a preposition
+    r"(?:in|on|since|during|last|this|next|from|to|until|till|by|of)\s+(?:may|mar|mon|sat|sun)|"
+    r"(?:may|mar)\s+\d{1,2}(?:st|nd|rd|th)?|\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:may|mar)|"
+    r"\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?)\b",
+    re.IGNORECASE,
+)
 
+_DATEPARSER_SETTINGS = {"PREFER_DATES_FROM": "past"}
 
-def extract_date_entities(text: str) -> List[str]:
+# "from X to Y" / "between X and Y"; search_dates misses the "between" form entirely
+_RANGE_RE = re.compile(
+    r"\b(?:from|between)\s+(?P<start>.+?)\s+(?:to|and|until|till|through)\s+(?P<end>.+?)\s*(?:[?.!,]|$)",
+    re.IGNORECASE,
+)
+_YEAR_RE = re.compile(r"\b\d{4}\b")
+
+
+@lru_cache(maxsize=1)
+def _get_nlp():
+    """
+    Load the spaCy pipeline on first use instead of at import time.
+    """
+    import spacy
+    # Only POS tags and lemmas are used; dates are handled by dateparser
+    return spacy.load("en_core_web_sm", disable=["parser", "ner"])
+
+
+def _resolve_end(start: datetime, end: datetime, end_text: str) -> datetime:
     """
-    Extract date entities from text using spaCy NER.
+    Place the end of a range relative to its start. PREFER_DATES_FROM=past resolves each
+    date on its own, so "March 1 to March 15" can land in different years; unless the end
+    names a year, it takes the start's year and rolls forward one if it would precede it.
     """
+    if _YEAR_RE.search(end_text):
+        return end
     try:
-        doc = nlp(text.lower())
-        dates = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
-        return dates
-    except Exception:
-        return []
+        end = end.replace(year=start.year)
+        if end < start:
+            end = end.replace(year=start.year + 1)
+    except ValueError:
+        # Feb 29 outside a leap year; keep dateparser's own choice
+        pass
+    return end
 
 
-def parse_date_range(dates: List[str]) -> Optional[Tuple[str, str]]:
+@lru_cache(maxsize=512)
+def _parse(text: str, today: str) -> Optional[Tuple[str, str]]:
     """
-    Parse a list of date strings into a (start_date_iso, end_date_iso) tuple.
+    Run dateparser over text. `today` is only part of the cache key, so relative
+    phrases like "last month" are re-resolved once the date changes.
     """
-    if not dates:
+    try:
+        import dateparser
+        from dateparser.search import search_dates
+
+        start = end = None
+        end_text = ""
+        range_match = _RANGE_RE.search(text)
+        if range_match:
+            end_text = range_match["end"]
+            start = dateparser.parse(range_match["start"], languages=["en"], settings=_DATEPARSER_SETTINGS)
+            end = dateparser.parse(end_text, languages=["en"], settings=_DATEPARSER_SETTINGS)
+
+        if start is None or end is None:
+            found = search_dates(text, languages=["en"], settings=_DATEPARSER_SETTINGS)
+            if not found:
+                return None
+            # First date found is the start, second (if any) is the end
+            start = end = found[0][1]
+            if len(found) > 1:
+                end_text, end = found[1]
+    except Exception:
         return None
 
-    # Parse first date as start, second as end 
-    start = dateparser.parse(dates[0])
-    end = dateparser.parse(dates) if len(dates) > 1 else None
+    if end is not start:
+        end = _resolve_end(start, end, end_text)
 
-    start_iso = start.strftime("%Y-%m-%d") if start else None
-    end_iso = end.strftime("%Y-%m-%d") if end else start_iso
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
 
-    if start_iso:
-        return start_iso, end_iso
-    else:
+
+def extract_date_range(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Find dates in text and return them as a (start_date_iso, end_date_iso) tuple.
+    """
+    if not _DATE_HINT_RE.search(text):
         return None
 
+    return _parse(text.lower(), date.today().isoformat())
+
 
 def extract_keywords(text: str) -> List[str]:
     """
     Extract keyword intents (nouns and proper nouns excluding stopwords).
     """
     try:
-        doc = nlp(text.lower())
+        doc = _get_nlp()(text.lower())
         keywords = [token.lemma_ for token in doc if token.pos_ in ("NOUN", "PROPN") and not token.is_stop]
         return keywords
     except Exception:
         return []
 
 
+@lru_cache(maxsize=1024)
+def _cached_filters(query: str, today: str) -> Tuple[Optional[Tuple[str, str]], Tuple[str, ...]]:
+    """
+    Memoized date range and keywords for a query, shared across users. `today`
+    keeps relative dates fresh across midnight, the same way `_parse` does.
+    """
+    return extract_date_range(query), tuple(extract_keywords(query))
+
+
 def extract_filters_from_query(query: str, user_id: str) -> Dict:
     """
     Extract user_id, date range, and keywords/intent filters from a user query.
     """
-    filters = {"user_id": user_id}
+    date_range, keywords = _cached_filters(query, date.today().isoformat())
 
-    date_entities = extract_date_entities(query)
-    date_range = parse_date_range(date_entities)
+    # Build a fresh dict each call so callers can't mutate the cached entry
+    filters = {"user_id": user_id}
     if date_range:
         filters["start_date"], filters["end_date"] = date_range
-
-    keywords = extract_keywords(query)
     if keywords:
-        filters["keywords"] = keywords
+        filters["keywords"] = list(keywords)
 
     return filters
-    
\ No newline at end of file
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import logging
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+class _Bucket:
+    """One faiss index of cached query vectors plus the matches returned for each"""
+
+    def __init__(self, dim: int):
+        # Vectors are kept as 8-bit codes (4x smaller than float32). Embeddings are unit
+        # vectors, so every component lies in [-1, 1]; training on the two corners of that
+        # box pins the quantizer range instead of learning it from data.
+        self.index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        bounds = np.ones((2, dim), dtype=np.float32)
+        bounds[0] = -1.0
+        self.index.train(bounds)
+        self.matches: List[List[Dict]] = []
+        self.added_at: List[float] = []
+
+
+class QueryVectorCache:
+    """
+    Client-side semantic cache in front of Pinecone.
+
+    A lookup hits when a previously seen query vector in the same bucket has cosine
+    similarity >= `threshold` (vectors are unit-normalized, so inner product == cosine)
+    and was stored less than `ttl` seconds ago. Buckets are keyed by the caller, e.g. on
+    (user_id, date range), so near-identical wording with different filters never collides.
+    At most `max_buckets` are kept, least recently used first out, and buckets whose
+    newest entry has expired are dropped whenever a new one is created.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        threshold: float = 0.95,
+        ttl: float = 300.0,
+        max_entries: int = 256,
+        max_buckets: int = 1024,
+    ):
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Hashable, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _as_row(vector) -> np.ndarray:
+        return np.ascontiguousarray(vector, dtype=np.float32).reshape(1, -1)
+
+    def lookup(self, key: Hashable, vector) -> Optional[List[Dict]]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.index.ntotal == 0:
+                return None
+            self._buckets.move_to_end(key)
+
+            scores, positions = bucket.index.search(self._as_row(vector), 1)
+            score, pos = float(scores[0, 0]), int(positions[0, 0])
+            if pos < 0 or score < self.threshold:
+                return None
+            if time.monotonic() - bucket.added_at[pos] > self.ttl:
+                return None
+
+            logger.debug("Query vector cache hit (similarity %.3f)", score)
+            return bucket.matches[pos]
+
+    def add(self, key: Hashable, vector, matches: List[Dict]) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict_buckets()
+                bucket = self._buckets[key] = _Bucket(self.dim)
+            else:
+                self._buckets.move_to_end(key)
+
+            bucket.index.add(self._as_row(vector))
+            bucket.matches.append(matches)
+            bucket.added_at.append(time.monotonic())
+
+            # Evict the oldest entries; flat-code indexes renumber the remaining ids to stay in step with the lists
+            overflow = bucket.index.ntotal - self.max_entries
+            if overflow > 0:
+                bucket.index.remove_ids(np.arange(overflow, dtype=np.int64))
+                del bucket.matches[:overflow]
+                del bucket.added_at[:overflow]
+
+    def _evict_buckets(self) -> None:
+        """Drop fully expired buckets, then the least recently used ones, to make room for one more"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [key for key, bucket in self._buckets.items() if not bucket.added_at or bucket.added_at[-1] < cutoff]
+        for key in expired:
+            del self._buckets[key]
+        while len(self._buckets) >= self.max_buckets:
+            self._buckets.popitem(last=False)
+
+
+# Global instance
+query_vector_cache = QueryVectorCache(config.EMBEDDING_DIMENSION)
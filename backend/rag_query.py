@@ -1,25 +1,95 @@
 from typing import List, Dict, Optional
-from cachetools import TTLCache, cached
+from functools import lru_cache
 from .query_filter import extract_filters_from_query
+from .vector_manager import embed_texts, expense_ids_in_range, index_query, user_version
+from .qvcache import query_vector_cache
+import asyncio
 import logging
+import re
+import time
 
 logger = logging.getLogger(__name__)
-query_cache = TTLCache(maxsize=100, ttl=300)
+# Cached matches expire when the wall clock moves into the next window of this many seconds
+QUERY_CACHE_TTL = 300
+_cache_hits = 0
+_cache_misses = 0
 
-@cached(query_cache)
-def query_user_expenses(index, user_id: str, query: str, top_k: int = 5) -> List[Dict]:
-    if index is None:
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Date ranges matching fewer ids than this are sent to Pinecone as an id list instead of a range
+MAX_ID_FILTER = 2000
+
+# Matches below this cosine similarity are noise and are dropped before they reach the prompt
+MIN_SCORE = 0.25
+
+def _norm(query: str) -> str:
+    """
+    Canonical form of a query for cache keys: lowercase, no punctuation, sorted unique words.
+    """
+    return " ".join(sorted(set(_PUNCTUATION_RE.sub(" ", query).lower().split())))
+
+@lru_cache(maxsize=256)
+def _query_cache_slot(user_id: str, version: int, norm_query: str, top_k: int, start_date, end_date, bucket: int) -> Dict:
+    """
+    Empty holder for one cache key. lru_cache does the lookup and LRU eviction, and
+    `bucket` (the current TTL window) retires entries from earlier windows. `version`
+    moves on whenever the user's expenses are upserted, so new rows are never hidden.
+    The coroutine result can't be memoized directly, so it is stored in the slot.
+    """
+    return {}
+
+async def query_user_expenses(user_id: str, query: str, top_k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+    """
+    Pass `filters` when the caller already ran extract_filters_from_query on this query,
+    so spaCy isn't run over the same text twice.
+    """
+    global _cache_hits, _cache_misses
+
+    if index_query is None:
         logger.warning("Pinecone index not available, returning empty results")
         return []
-    
-    filter_criteria = {"user_id": {"$eq": user_id}}
 
-    filters = extract_filters_from_query(query, user_id)
+    if filters is None:
+        filters = await asyncio.to_thread(extract_filters_from_query, query, user_id)
+
+    start_date = filters.get("start_date")
+    end_date = filters.get("end_date")
+
+    # Word order is dropped by _norm, so the date range is part of the key to keep
+    # "from March to May" and "from May to March" apart
+    version = user_version(user_id)
+    slot = _query_cache_slot(user_id, version, _norm(query), top_k, start_date, end_date, int(time.time() // QUERY_CACHE_TTL))
+    matches = slot.get("matches")
+    if matches is not None:
+        _cache_hits += 1
+        logger.debug("Query cache hit (%s hits / %s misses)", _cache_hits, _cache_misses)
+        return matches
+
+    _cache_misses += 1
+    logger.debug("Query cache miss (%s hits / %s misses)", _cache_hits, _cache_misses)
+    matches = await asyncio.to_thread(_search_pinecone, user_id, version, query, top_k, filters)
+    slot["matches"] = matches
+    return matches
+
+def _relevant_matches(matches: List[Dict], top_k: int) -> List[Dict]:
+    # Pinecone returns matches best-first, so the first top_k survivors are the best ones
+    return [match for match in matches if match.get('score', 0) >= MIN_SCORE][:top_k]
+
+def _search_pinecone(user_id: str, version: int, query: str, top_k: int, filters: Dict) -> List[Dict]:
+    filter_criteria = {"user_id": {"$eq": user_id}}
 
     start_date = filters.get("start_date")
     end_date = filters.get("end_date")
     if start_date and end_date:
-        filter_criteria["date"] = {"$gte": start_date, "$lte": end_date}
+        # Resolve the range locally first: no ids means nothing to search, and a short
+        # id list narrows Pinecone's candidate set more than a range filter does
+        expense_ids = expense_ids_in_range(user_id, start_date, end_date)
+        if not expense_ids:
+            return []
+        if len(expense_ids) < MAX_ID_FILTER:
+            filter_criteria["expense_id"] = {"$in": expense_ids}
+        else:
+            filter_criteria["date"] = {"$gte": start_date, "$lte": end_date}
     
     keywords = filters.get("keywords")
     query_text = query
@@ -27,50 +97,36 @@ def query_user_expenses(index, user_id: str, query: str, top_k: int = 5) -> List
         query_text = query + " " + " ".join(keywords)
     
     try:
-        if hasattr(index, 'query'):
-            try:
-                results = index.query(
-                    vector=query_text,
-                    top_k=top_k,
-                    filter=filter_criteria,
-                    include_metadata=True
-                )
-                return results.get('matches', [])
-            except TypeError:
-                # Fallback to old API format
-                try:
-                    results = index.query(
-                        vector=query_text,
-                        top_k=top_k,
-                        filter=filter_criteria,
-                        include_metadata=True
-                    )
-                    return results.get('matches', [])
-                except Exception as e:
-                    logger.error(f"Failed to query with legacy API: {e}")
-                    return []
-        else:
-            logger.warning("Pinecone index does not have query method")
-            return []
-            
-    except Exception as e:
-        logger.error(f"Error querying Pinecone: {e}")
-        return []
+        embedding = embed_texts([query_text])[0]
+        query_vector = embedding.tolist()
 
+        # A near-duplicate of a recent query with the same filters can reuse its matches
+        semantic_key = (user_id, version, start_date, end_date, top_k)
+        cached_matches = query_vector_cache.lookup(semantic_key, embedding)
+        if cached_matches is not None:
+            return cached_matches
 
-def format_context_from_results(results: List[Dict]) -> str:
-    if not results:
-        return "No relevant expense data found for your query."
+        # Over-fetch so enough matches survive the score cutoff
+        results = index_query(
+            vector=query_vector,
+            top_k=max(top_k * 2, 10),
+            filter=filter_criteria,
+            include_metadata=True
+        )
+        matches = _relevant_matches(results.get('matches', []), top_k)
+        query_vector_cache.add(semantic_key, embedding, matches)
+        return matches
 
-    context_lines = []
-    for match in results:
-        meta = match.get('metadata', {})
-        text = meta.get('text') or meta.get('chunk_text') or meta.get('description') or ""
-        if text:
-            context_lines.append(text)
+    except Exception as e:
+        logger.error("Error querying Pinecone: %s", e)
+        return []
 
-    if not context_lines:
-        return "No relevant expense data found for your query."
 
-    return "\n".join(context_lines)
+def format_context_from_results(results: List[Dict]) -> str:
+    context = "\n".join(
+        text
+        for match in results
+        if (text := (m := match.get('metadata', {})).get('text') or m.get('chunk_text') or m.get('description'))
+    )
+    return context or "No relevant expense data found for your query."
     
\ No newline at end of file
@@ -0,0 +1,21 @@
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+
+
+class Expense(BaseModel):
+    """A single expense row as sent by the frontend"""
+    # Keep extra columns (id, icon, created_at, ...) so they reach the pipeline untouched
+    model_config = ConfigDict(extra="allow")
+
+    user_id: str
+    amount: float
+    category: str
+    description: Optional[str]
+    date: datetime
+
+
+class QueryBody(BaseModel):
+    """Request body for /api/query-fingpt"""
+    question: str
+    expenses: List[Expense]
@@ -1,78 +1,259 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict
+from functools import lru_cache
+from itertools import islice
+import asyncio
 import logging
+import os
+import sqlite3
+import threading
+import time
 import hashlib
-import json
+import blake3
+from .config import config
 from .pinecone_manager import pinecone_manager
 
 logger = logging.getLogger(__name__)
 
+# Pinecone recommends at most ~100 vectors / 2MB per upsert request
+UPSERT_BATCH_SIZE = 100
+UPSERT_MAX_RETRIES = 3
+UPSERT_BACKOFF_SECONDS = 0.5
+
+# Text embedded for each expense, filled straight from the expense dict
+_EXPENSE_TEXT_TEMPLATE = "Date: {date}, Amount: ₹{amount:.2f}, Category: {category}, Description: {description}"
+
 # Get the index from the manager
 index = pinecone_manager.get_index()
 
+# Bound methods resolved once so the hot paths don't look them up per call
+index_upsert = getattr(index, "upsert", None)
+index_query = getattr(index, "query", None)
+
 if index:
     logger.info("Pinecone index available")
+    if index_upsert is None or index_query is None:
+        logger.warning("Pinecone index is missing upsert/query methods - vector search disabled")
 else:
     logger.warning("Pinecone index not available - vector search disabled")
 
-def build_docs_from_expenses(expenses: List[dict]) -> Tuple[List[str], List[str], List[Dict]]:
-    texts = []
-    ids = []
-    metadata = []
-    for e in expenses:
-        text = f"Date: {e['date']}, Amount: ₹{e['amount']:.2f}, Category: {e['category']}, Description: {e['description']}"
-        texts.append(text)
-        # Generate a unique ID if expense_id doesn't exist
-        expense_id = e.get('expense_id') or f"{e['user_id']}_{e['date']}_{e['amount']}_{e['category']}"
-        ids.append(expense_id) 
-        metadata.append({
-            "user_id": e["user_id"], 
-            "date": e["date"], 
+# Local record of what has been upserted (expense id -> text hash), plus a scalar sidecar
+# (expense_meta) used to resolve date ranges to ids before querying Pinecone.
+# Shared by the upsert worker threads, so every access goes through _embed_cache_lock.
+_embed_cache_lock = threading.Lock()
+# Bumped whenever a user's stored expenses change; query caches include it in their keys
+_user_versions: Dict[str, int] = {}
+
+def user_version(user_id: str) -> int:
+    return _user_versions.get(user_id, 0)
+
+# SQLite caps the number of ? parameters per statement
+_SQLITE_MAX_PARAMS = 900
+
+@lru_cache(maxsize=1)
+def _get_embed_cache() -> sqlite3.Connection:
+    """
+    Open the upsert record on first use. The rows describe one particular index, so they
+    are dropped when the index name or dimension changes, or when the index was just created.
+    """
+    # WAL plus a busy timeout lets several uvicorn workers share the file
+    conn = sqlite3.connect(config.EMBED_CACHE_PATH, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS cache_info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    index_tag = f"{config.PINECONE_INDEX_NAME}:{config.EMBEDDING_DIMENSION}"
+    row = conn.execute("SELECT value FROM cache_info WHERE key = 'index'").fetchone()
+    if row is None or row[0] != index_tag or pinecone_manager.created_index:
+        logger.info("Upsert record does not match index %s, starting it fresh", index_tag)
+        conn.execute("DROP TABLE IF EXISTS embed_cache")
+        conn.execute("DROP TABLE IF EXISTS expense_meta")
+        conn.execute("INSERT OR REPLACE INTO cache_info VALUES ('index', ?)", (index_tag,))
+
+    conn.execute("CREATE TABLE IF NOT EXISTS embed_cache (id TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS expense_meta "
+        "(expense_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, date TEXT NOT NULL, amount REAL, category TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS expense_meta_user_date ON expense_meta (user_id, date)")
+    conn.commit()
+    return conn
+
+@lru_cache(maxsize=1)
+def _get_embedder():
+    """
+    Load the sentence embedding model once per process.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Split the cores between worker processes instead of oversubscribing them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // config.WORKERS))
+    model = SentenceTransformer(config.EMBEDDING_MODEL)
+    model.eval()
+    return model
+
+def warm_up_embedder() -> None:
+    """
+    Load the embedding model ahead of the first request.
+    """
+    embed_texts(["warm up"])
+
+def embed_texts(texts: List[str]):
+    """
+    Embed a batch of texts in one call, returning an (N, d) float32 array of unit vectors.
+    """
+    import torch
+
+    model = _get_embedder()
+    with torch.inference_mode():
+        return model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+
+def _mkid(e: Dict) -> str:
+    """
+    Stable id derived from every identifying field, so re-sent rows map to the same vector.
+    """
+    key = f"{e['user_id']}|{e['date']}|{e['amount']}|{e['category']}|{e['description']}"
+    return blake3.blake3(key.encode()).hexdigest()[:24]
+
+def _expense_id(e: Dict) -> str:
+    """
+    The caller's stable id when there is one (the frontend sends the Supabase row `id`),
+    so edits overwrite the same vector; otherwise a content hash.
+    """
+    expense_id = e.get('expense_id') or e.get('id')
+    return str(expense_id) if expense_id else _mkid(e)
+
+def _build_metadata(expenses: List[dict]) -> List[Dict]:
+    """
+    One pass over the expenses producing the Pinecone metadata for each row.
+    The metadata carries the id and text, so no separate lists are kept.
+    """
+    render = _EXPENSE_TEXT_TEMPLATE.format_map
+    return [
+        {
+            "expense_id": _expense_id(e),
+            "user_id": e["user_id"],
+            "date": e["date"],
             "category": e["category"],
             "amount": e["amount"],
-            "text": text  
-        })
-    return texts, ids, metadata
+            "text": render(e)
+        }
+        for e in expenses
+    ]
+
+def _build_vectors(metadata: List[Dict], embeddings) -> List[Dict]:
+    # One C-level conversion of the whole (N, d) array instead of a .tolist() per row
+    return [
+        {"id": meta["expense_id"], "values": values, "metadata": meta}
+        for meta, values in zip(metadata, embeddings.tolist())
+    ]
+
+def _chunks(iterable, n: int):
+    it = iter(iterable)
+    chunk = tuple(islice(it, n))
+    while chunk:
+        yield chunk
+        chunk = tuple(islice(it, n))
+
+def _upsert_chunk(chunk) -> None:
+    """
+    Upsert one batch, retrying failures with exponential backoff.
+    """
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            index_upsert(vectors=list(chunk))
+            return
+        except TypeError:
+            # Wrong SDK signature, retrying won't help
+            raise
+        except Exception as e:
+            if attempt == UPSERT_MAX_RETRIES:
+                raise
+            delay = UPSERT_BACKOFF_SECONDS * (2 ** attempt)
+            logger.warning("Upsert batch of %s failed (%s), retrying in %.1fs", len(chunk), e, delay)
+            time.sleep(delay)
 
-def upsert_expenses_to_pinecone(expenses: List[Dict]) -> None:
+def _stored_hashes(ids: List[str]) -> Dict[str, str]:
+    stored = {}
+    with _embed_cache_lock:
+        conn = _get_embed_cache()
+        for chunk in _chunks(ids, _SQLITE_MAX_PARAMS):
+            placeholders = ",".join("?" * len(chunk))
+            # Rows missing from the sidecar count as not stored, so they get written again
+            rows = conn.execute(
+                "SELECT e.id, e.hash FROM embed_cache e JOIN expense_meta m ON m.expense_id = e.id "
+                f"WHERE e.id IN ({placeholders})",
+                chunk
+            )
+            stored.update(rows)
+    return stored
+
+def _record_upserted(metadata: List[Dict], hashes: List[str]) -> None:
+    rows = [(meta["expense_id"], h) for meta, h in zip(metadata, hashes)]
+    # Dates are stored as YYYY-MM-DD so BETWEEN on ISO day strings includes the whole end day
+    meta_rows = [
+        (meta["expense_id"], meta["user_id"], str(meta["date"])[:10], meta["amount"], meta["category"])
+        for meta in metadata
+    ]
+    with _embed_cache_lock:
+        conn = _get_embed_cache()
+        conn.executemany("INSERT OR REPLACE INTO embed_cache (id, hash) VALUES (?, ?)", rows)
+        conn.executemany("INSERT OR REPLACE INTO expense_meta VALUES (?, ?, ?, ?, ?)", meta_rows)
+        conn.commit()
+
+def expense_ids_in_range(user_id: str, start_date: str, end_date: str) -> List[str]:
+    """
+    Ids of the user's stored expenses dated within [start_date, end_date] (YYYY-MM-DD).
+    """
+    with _embed_cache_lock:
+        rows = _get_embed_cache().execute(
+            "SELECT expense_id FROM expense_meta WHERE user_id = ? AND date BETWEEN ? AND ?",
+            (user_id, start_date, end_date)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+async def upsert_expenses_to_pinecone(expenses: List[Dict]) -> bool:
+    """
+    Store the expenses in Pinecone. Returns True only when every row is stored,
+    so callers know whether it is safe to skip these rows next time.
+    """
     if not expenses:
-        return
+        return True
     
-    if index is None:
+    if index_upsert is None:
         logger.warning("Pinecone index not available, skipping upsert")
-        return
+        return False
     
-    user_ids = {e['user_id'] for e in expenses}
-    if len(user_ids) != 1:
-        raise ValueError("All expenses to upsert must belong to the same user_id.")
+    # Stop at the first row from a different user instead of building a set
+    first_user_id = expenses[0]['user_id']
+    for e in islice(expenses, 1, None):
+        if e['user_id'] != first_user_id:
+            raise ValueError("All expenses to upsert must belong to the same user_id.")
     
-    texts, ids, metadata = build_docs_from_expenses(expenses)
+    metadata = _build_metadata(expenses)
+
+    # Only rows whose text changed since they were last stored need embedding and upserting
+    hashes = [hashlib.sha256(meta["text"].encode()).hexdigest() for meta in metadata]
+    stored = await asyncio.to_thread(_stored_hashes, [meta["expense_id"] for meta in metadata])
+    changed = [i for i, (meta, h) in enumerate(zip(metadata, hashes)) if stored.get(meta["expense_id"]) != h]
+    if not changed:
+        logger.info("All %s expenses already stored, skipping upsert", len(expenses))
+        return True
+    metadata = [metadata[i] for i in changed]
+    hashes = [hashes[i] for i in changed]
     
     try:
-        # Create vectors using simple hash-based approach
-        vectors = []
-        for text, idx, meta in zip(texts, ids, metadata):
-            vector = text
-            vectors.append({
-                "id": idx,
-                "values": vector,
-                "metadata": meta
-            })
-        
-        # Use the correct Pinecone API format
-        if hasattr(index, 'upsert'):
-            # Try the new API format first
-            try:
-                index.upsert(vectors=vectors)
-                logger.info(f"Successfully upserted {len(expenses)} expenses to Pinecone")
-            except TypeError:
-                # Fallback to old API format
-                try:
-                    index.upsert(records=vectors)
-                    logger.info(f"Successfully upserted {len(expenses)} expenses to Pinecone (legacy API)")
-                except Exception as e:
-                    logger.error(f"Failed to upsert with legacy API: {e}")
-        else:
-            logger.warning("Pinecone index does not have upsert method")
-            
+        # Embed all changed texts in a single batch, off the event loop
+        embeddings = await asyncio.to_thread(embed_texts, [meta["text"] for meta in metadata])
+        vectors = _build_vectors(metadata, embeddings)
+
+        # Send batches in parallel from worker threads
+        chunks = list(_chunks(vectors, UPSERT_BATCH_SIZE))
+        await asyncio.gather(*(asyncio.to_thread(_upsert_chunk, chunk) for chunk in chunks))
+        logger.info("Successfully upserted %s expenses to Pinecone in %s batches", len(vectors), len(chunks))
+        await asyncio.to_thread(_record_upserted, metadata, hashes)
+        _user_versions[first_user_id] = user_version(first_user_id) + 1
+        return True
+
     except Exception as e:
-        logger.error(f"Error during Pinecone upsert: {e}")
\ No newline at end of file
+        logger.error("Error during Pinecone upsert: %s", e)
+        return False
\ No newline at end of file
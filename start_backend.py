@@ -1,9 +1,26 @@
+import os
+
 import uvicorn
+from dotenv import load_dotenv
 
 if __name__ == "__main__":
+    # backend.config is deliberately not imported here: it memoizes WORKERS on import,
+    # so the effective count has to be in the environment before anything reads it
+    load_dotenv()
+
+    # DEV=1 keeps the auto-reloading single-process server for local work
+    dev = os.getenv("DEV") == "1"
+    workers = max(1, int(os.getenv("WORKERS", "1")))
+    # Every worker loads its own copy of the local model onto the same device
+    if dev or os.getenv("LOCAL_MODEL_ID"):
+        workers = 1
+    # Workers (and the reload child) read this back through config to size their torch thread pools
+    os.environ["WORKERS"] = str(workers)
+
     print("🚀 Starting BudgetBot Backend...")
     print("🌐 Server will be available at: http://localhost:8000")
     print("📚 API docs will be at: http://localhost:8000/docs")
+    print(f"⚙️  Mode: {'development (reload)' if dev else f'production ({workers} workers)'}")
     print("Press Ctrl+C to stop the server")
     print("=" * 50)
     
@@ -11,6 +28,9 @@ if __name__ == "__main__":
         "backend.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        reload=dev,
         log_level="info"
     )
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+from backend.query_filter import extract_date_range
+
+
+def _days(date_range):
+    start, end = (date.fromisoformat(d) for d in date_range)
+    return end - start
+
+
+def test_from_to_range_stays_in_one_year():
+    date_range = extract_date_range("How much did I spend from March 1 to March 15?")
+
+    assert date_range is not None
+    assert date_range[0].endswith("-03-01")
+    assert _days(date_range) == timedelta(days=14)
+
+
+def test_between_and_range():
+    date_range = extract_date_range("What did I spend between jan 5 and jan 20?")
+
+    assert date_range is not None
+    assert date_range[0].endswith("-01-05")
+    assert _days(date_range) == timedelta(days=15)
+
+
+def test_range_across_new_year_rolls_the_end_forward():
+    date_range = extract_date_range("spending from dec 20 to jan 5")
+
+    assert date_range is not None
+    assert date_range[0].endswith("-12-20")
+    assert _days(date_range) == timedelta(days=16)
+
+
+def test_modal_may_is_not_a_date():
+    assert extract_date_range("May I save more on food?") is None
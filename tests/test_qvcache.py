@@ -0,0 +1,33 @@
+import numpy as np
+
+from backend.qvcache import QueryVectorCache
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_lookup_returns_matches_for_a_near_identical_vector():
+    cache = QueryVectorCache(dim=4)
+    matches = [{"id": "a", "score": 0.9}]
+    cache.add(("u1", None, None, 5), _unit([1, 0, 0, 0]), matches)
+
+    assert cache.lookup(("u1", None, None, 5), _unit([1, 0.01, 0, 0])) == matches
+
+
+def test_lookup_misses_for_another_key_or_a_dissimilar_vector():
+    cache = QueryVectorCache(dim=4)
+    cache.add(("u1", None, None, 5), _unit([1, 0, 0, 0]), [{"id": "a"}])
+
+    assert cache.lookup(("u2", None, None, 5), _unit([1, 0, 0, 0])) is None
+    assert cache.lookup(("u1", None, None, 5), _unit([0, 1, 0, 0])) is None
+
+
+def test_bucket_count_is_bounded():
+    cache = QueryVectorCache(dim=4, max_buckets=2)
+    for user_id in ("u1", "u2", "u3"):
+        cache.add((user_id, None, None, 5), _unit([1, 0, 0, 0]), [{"id": user_id}])
+
+    assert cache.lookup(("u1", None, None, 5), _unit([1, 0, 0, 0])) is None
+    assert cache.lookup(("u3", None, None, 5), _unit([1, 0, 0, 0])) == [{"id": "u3"}]